@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Script de Calibração de Probabilidades e Ajuste de Limiares por Segmento
+Sistema de Predição de Evasão Estudantil
+"""
+
+import pandas as pd
+import numpy as np
+import joblib
+import sys
+from pathlib import Path
+import warnings
+warnings.filterwarnings('ignore')
+
+from deploy_model import (
+    load_model_and_preprocessors,
+    encode_features,
+    score_dropout_proba,
+    apply_calibration,
+    lookup_thresholds,
+)
+
+# Configurações da calibração
+CALIBRATION_METHOD = 'auto'              # 'auto', 'isotonic' ou 'sigmoid' (Platt scaling)
+ISOTONIC_MIN_SAMPLES = 1000              # 'auto' só usa isotônica a partir deste tamanho
+# Níveis de segmentação, do mais específico ao mais geral
+SEGMENT_LEVELS = [
+    ['current_semester', 'socioeconomic_level'],
+    ['current_semester'],
+    ['socioeconomic_level'],
+]
+MAX_FLAG_RATE = 0.30                     # Orçamento de intervenção: no máximo 30% sinalizados
+MIN_SEGMENT_SIZE = 30                    # Segmentos menores passam para o próximo nível
+MIN_SEGMENT_POSITIVES = 3                # Mínimo de evasões para um segmento ter limiar próprio
+N_SPLITS = 5                             # Folds da validação cruzada das métricas reportadas
+
+def load_holdout_data(base_path, label_encoders):
+    """
+    Reproduz a divisão treino/teste do notebook 02 e retorna o conjunto de teste
+
+    O modelo nunca viu essas amostras, então elas servem para calibração.
+
+    Args:
+        base_path: Raiz do projeto
+        label_encoders: Encoders para variáveis categóricas
+
+    Returns:
+        Tupla (X_holdout, y_holdout)
+    """
+    from sklearn.model_selection import train_test_split
+
+    df = pd.read_csv(base_path / 'data' / 'student_dropout_dataset.csv')
+    X = encode_features(df.drop(['dropout', 'student_id'], axis=1), label_encoders)
+    y = df['dropout']
+
+    _, X_holdout, _, y_holdout = train_test_split(
+        X, y, test_size=0.2, random_state=42, stratify=y
+    )
+
+    return X_holdout, y_holdout
+
+def fit_calibrator(raw_proba, y, method='auto'):
+    """
+    Ajusta um calibrador sobre as probabilidades brutas do modelo
+
+    Com poucas amostras a regressão isotônica colapsa os scores em poucos
+    degraus; por isso 'auto' usa Platt scaling, que preserva o ranking.
+
+    Args:
+        raw_proba: Probabilidades brutas no conjunto de calibração
+        y: Rótulos verdadeiros
+        method: 'auto', 'isotonic' (regressão isotônica) ou 'sigmoid' (Platt scaling)
+
+    Returns:
+        Dicionário {'method', 'calibrator'} usado por apply_calibration
+    """
+    from sklearn.isotonic import IsotonicRegression
+    from sklearn.linear_model import LogisticRegression
+
+    raw_proba = np.asarray(raw_proba, dtype=float)
+    y = np.asarray(y)
+
+    if method == 'auto':
+        method = 'isotonic' if len(raw_proba) >= ISOTONIC_MIN_SAMPLES else 'sigmoid'
+
+    if method == 'isotonic':
+        calibrator = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds='clip')
+        calibrator.fit(raw_proba, y)
+    elif method == 'sigmoid':
+        calibrator = LogisticRegression()
+        calibrator.fit(raw_proba.reshape(-1, 1), y)
+    else:
+        raise ValueError(f"Método de calibração desconhecido: {method}")
+
+    return {'method': method, 'calibrator': calibrator}
+
+def _best_cutoffs(scores, y, codes, max_flag_rate=None):
+    """
+    Encontra, para cada grupo, o limiar que maximiza o F1-Score
+
+    Ordena uma única vez por (grupo, score decrescente) e varre todos os
+    cortes possíveis com somas acumuladas - custo O(n log n).
+
+    Args:
+        scores: Array de probabilidades
+        y: Array de rótulos (0/1)
+        codes: Array de inteiros 0..k-1 identificando o grupo de cada linha
+        max_flag_rate: Fração máxima de cada grupo que pode ser sinalizada
+
+    Returns:
+        Tupla (limiar, f1, tamanho, positivos) - arrays indexados pelo grupo
+    """
+    n_groups = codes.max() + 1
+    order = np.lexsort((-scores, codes))
+    s, yy, c = scores[order], y[order], codes[order]
+
+    sizes = np.bincount(c, minlength=n_groups)
+    positives = np.bincount(c, weights=yy, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+    # Verdadeiros positivos e quantidade sinalizada ao cortar em cada posição
+    tp_cum = np.cumsum(yy)
+    tp_before = np.where(starts > 0, tp_cum[starts - 1], 0)
+    tp = tp_cum - tp_before[c]
+    flagged = np.arange(len(s)) - starts[c] + 1
+    f1 = 2 * tp / (flagged + positives[c])
+
+    # Só é possível cortar no fim de um bloco de scores empatados
+    valid = np.ones(len(s), dtype=bool)
+    valid[:-1] = (c[1:] != c[:-1]) | (s[1:] != s[:-1])
+    if max_flag_rate is not None:
+        valid &= flagged <= max_flag_rate * sizes[c]
+    f1 = np.where(valid, f1, -1.0)
+
+    # Melhor corte de cada grupo: primeiro elemento após ordenar por F1 decrescente
+    best_order = np.lexsort((-f1, c))
+    first = best_order[starts[sizes > 0]]
+
+    thresholds = np.full(n_groups, np.inf)
+    best_f1 = np.zeros(n_groups)
+    groups = c[first]
+    found = f1[first] >= 0
+    thresholds[groups[found]] = s[first][found]
+    best_f1[groups[found]] = f1[first][found]
+
+    return thresholds, best_f1, sizes, positives
+
+def _segment_key(key):
+    """Converte a chave de um segmento em tupla de tipos nativos do Python"""
+    return tuple(v.item() if isinstance(v, np.generic) else v for v in key)
+
+def optimize_segment_thresholds(scores, y, segments, segment_levels,
+                                max_flag_rate=None, min_segment_size=30,
+                                min_segment_positives=1):
+    """
+    Ajusta limiares de decisão por segmento, com recuo hierárquico
+
+    Um estudante é sinalizado quando score >= limiar. Os limiares são
+    ajustados sobre o score bruto do modelo (mesma ordem da probabilidade
+    calibrada, sem empates artificiais) e valem com ou sem calibrador.
+
+    Os níveis são percorridos do mais específico ao mais geral. Em cada
+    nível, os segmentos com pelo menos min_segment_size estudantes e
+    min_segment_positives evasões (contando só os estudantes ainda sem
+    limiar) recebem limiar próprio; os demais seguem para o próximo nível.
+    O limiar global é ajustado apenas sobre quem sobrou. Como cada grupo
+    respeita max_flag_rate sobre as próprias linhas, o total sinalizado
+    também respeita o orçamento.
+
+    Args:
+        scores: Probabilidades brutas do modelo (score_dropout_proba)
+        y: Rótulos verdadeiros
+        segments: DataFrame com as colunas de segmento
+        segment_levels: Lista de listas de colunas, do nível mais específico ao mais geral
+        max_flag_rate: Fração máxima sinalizada (orçamento)
+        min_segment_size: Tamanho mínimo para um segmento ter limiar próprio
+        min_segment_positives: Mínimo de evasões para um segmento ter limiar próprio
+
+    Returns:
+        Dicionário com 'score_scale', 'levels', 'global_threshold' e
+        'max_flag_rate', no formato esperado por lookup_thresholds
+    """
+    scores = np.asarray(scores, dtype=float)
+    y = np.asarray(y, dtype=float)
+    remaining = np.ones(len(scores), dtype=bool)
+
+    levels = []
+    for columns in segment_levels:
+        rows = np.flatnonzero(remaining)
+        level = {'columns': list(columns), 'thresholds': {}}
+        levels.append(level)
+        if len(rows) == 0:
+            continue
+
+        codes, uniques = pd.MultiIndex.from_frame(
+            segments[columns].iloc[rows]
+        ).factorize()
+        level_thresholds, _, sizes, positives = _best_cutoffs(
+            scores[rows], y[rows], codes, max_flag_rate
+        )
+
+        eligible = (sizes >= min_segment_size) & (positives >= min_segment_positives)
+        level['thresholds'] = {
+            _segment_key(key): float(thr)
+            for key, thr, ok in zip(uniques, level_thresholds, eligible) if ok
+        }
+        remaining[rows[eligible[codes]]] = False
+
+    # Limiar global: apenas para quem não recebeu limiar de segmento
+    # (ou todas as linhas, se nenhuma sobrou - cobre segmentos não vistos)
+    fallback = remaining if remaining.any() else np.ones(len(scores), dtype=bool)
+    global_threshold, _, _, _ = _best_cutoffs(
+        scores[fallback], y[fallback], np.zeros(fallback.sum(), dtype=np.intp),
+        max_flag_rate
+    )
+
+    return {
+        'score_scale': 'raw',
+        'levels': levels,
+        'global_threshold': float(global_threshold[0]),
+        'max_flag_rate': max_flag_rate,
+    }
+
+def cross_validate_calibration(raw_proba, y, segments, n_splits=5, random_state=42):
+    """
+    Estima, fora da amostra, o efeito do calibrador e dos limiares
+
+    Em cada fold, calibrador e limiares são ajustados nos demais folds e
+    aplicados ao fold separado, de modo que nenhuma métrica reportada é
+    calculada sobre as linhas usadas no ajuste.
+
+    Args:
+        raw_proba: Probabilidades brutas no conjunto held-out
+        y: Rótulos verdadeiros
+        segments: DataFrame com as colunas de segmento
+        n_splits: Número de folds
+        random_state: Seed para reprodutibilidade
+
+    Returns:
+        Tupla (probabilidades calibradas, predições) fora da amostra
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    raw_proba = np.asarray(raw_proba, dtype=float)
+    y = np.asarray(y)
+    oof_proba = np.zeros(len(y))
+    oof_flags = np.zeros(len(y), dtype=int)
+
+    folds = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    for train_idx, test_idx in folds.split(raw_proba, y):
+        calibration = fit_calibrator(raw_proba[train_idx], y[train_idx], CALIBRATION_METHOD)
+        oof_proba[test_idx] = apply_calibration(calibration, raw_proba[test_idx])
+
+        thresholds = optimize_segment_thresholds(
+            raw_proba[train_idx], y[train_idx], segments.iloc[train_idx], SEGMENT_LEVELS,
+            max_flag_rate=MAX_FLAG_RATE, min_segment_size=MIN_SEGMENT_SIZE,
+            min_segment_positives=MIN_SEGMENT_POSITIVES
+        )
+        threshold = lookup_thresholds(thresholds, segments.iloc[test_idx])
+        oof_flags[test_idx] = raw_proba[test_idx] >= threshold
+
+    return oof_proba, oof_flags
+
+def _brute_force_cutoff(scores, y, max_flag_rate=None):
+    """Referência O(n²) para _best_cutoffs: testa cada score como limiar"""
+    # Do maior para o menor limiar: em caso de empate no F1, sinaliza menos
+    best_f1, best_threshold = -1.0, np.inf
+    for threshold in np.unique(scores)[::-1]:
+        flagged = scores >= threshold
+        if max_flag_rate is not None and flagged.sum() > max_flag_rate * len(scores):
+            continue
+        f1 = 2 * (flagged & (y == 1)).sum() / (flagged.sum() + y.sum())
+        if f1 > best_f1:
+            best_f1, best_threshold = f1, threshold
+    return best_f1, best_threshold
+
+def self_check(n_cases=300, random_seed=0):
+    """
+    Confere o otimizador vetorizado contra a varredura por força bruta
+
+    Usa scores arredondados (com empates) e grupos aleatórios. Também
+    confere que o total sinalizado por optimize_segment_thresholds respeita
+    o orçamento nos dados de ajuste.
+    """
+    rng = np.random.default_rng(random_seed)
+    for case in range(n_cases):
+        n = rng.integers(1, 80)
+        scores = np.round(rng.random(n), 1)
+        y = (rng.random(n) < 0.3).astype(float)
+        codes = rng.integers(0, 4, n)
+        codes = np.unique(codes, return_inverse=True)[1]
+        max_flag_rate = [None, 0.3][case % 2]
+
+        thresholds, best_f1, _, _ = _best_cutoffs(scores, y, codes, max_flag_rate)
+        for group in range(codes.max() + 1):
+            mask = codes == group
+            expected_f1, expected_threshold = _brute_force_cutoff(
+                scores[mask], y[mask], max_flag_rate
+            )
+            if expected_f1 < 0:
+                assert thresholds[group] == np.inf, (case, group)
+            else:
+                assert np.isclose(best_f1[group], expected_f1), (case, group)
+                assert thresholds[group] == expected_threshold, (case, group)
+
+        segments = pd.DataFrame({'a': rng.integers(1, 4, n), 'b': rng.integers(1, 4, n)})
+        result = optimize_segment_thresholds(
+            scores, y, segments, [['a', 'b'], ['a'], ['b']],
+            max_flag_rate=0.3, min_segment_size=5
+        )
+        flagged = scores >= lookup_thresholds(result, segments)
+        assert flagged.sum() <= 0.3 * n, case
+
+    print(f"✅ Self-check: {n_cases} casos conferidos contra força bruta")
+
+def main():
+    """Função principal - Calibração e ajuste de limiares"""
+    print("=" * 70)
+    print("CALIBRAÇÃO DE PROBABILIDADES E LIMIARES POR SEGMENTO")
+    print("=" * 70)
+    print()
+
+    base_path = Path(__file__).parent.parent
+
+    # Carregar modelo e pré-processadores
+    print("📦 Carregando modelo e pré-processadores...")
+    model, scaler, label_encoders = load_model_and_preprocessors()
+    X_holdout, y_holdout = load_holdout_data(base_path, label_encoders)
+    print(f"📊 Conjunto de calibração (held-out): {len(X_holdout)} amostras")
+    print()
+
+    # Calibrar probabilidades
+    raw_proba = score_dropout_proba(model, X_holdout, scaler)
+    calibration = fit_calibrator(raw_proba, y_holdout, CALIBRATION_METHOD)
+    print(f"🔄 Calibrador ajustado ({calibration['method']})")
+
+    # Ajustar limiares por segmento
+    print("\n🔄 Ajustando limiares por segmento...")
+    thresholds = optimize_segment_thresholds(
+        raw_proba, y_holdout, X_holdout, SEGMENT_LEVELS,
+        max_flag_rate=MAX_FLAG_RATE, min_segment_size=MIN_SEGMENT_SIZE,
+        min_segment_positives=MIN_SEGMENT_POSITIVES
+    )
+    n_segments = 0
+    for level in thresholds['levels']:
+        print(f"   - Nível ({' × '.join(level['columns'])}): "
+              f"{len(level['thresholds'])} segmentos com limiar próprio")
+        for segment, threshold in sorted(level['thresholds'].items()):
+            print(f"     {dict(zip(level['columns'], segment))}: {threshold:.4f}")
+        n_segments += len(level['thresholds'])
+    print(f"   - Limiar global (demais estudantes): {thresholds['global_threshold']:.4f}")
+
+    if n_segments == 0:
+        print(f"\n⚠️  Nenhum segmento atingiu {MIN_SEGMENT_SIZE} estudantes e "
+              f"{MIN_SEGMENT_POSITIVES} evasões - todos usam o limiar global.")
+        print("   💡 Use mais dados de calibração ou reduza MIN_SEGMENT_SIZE.")
+
+    # Avaliar fora da amostra (validação cruzada no held-out)
+    y_true = y_holdout.to_numpy()
+    oof_proba, oof_flags = cross_validate_calibration(
+        raw_proba, y_true, X_holdout, n_splits=N_SPLITS
+    )
+    true_positives = (oof_flags & y_true).sum()
+    print(f"\n📈 Métricas fora da amostra ({N_SPLITS}-fold no held-out):")
+    print(f"   - Brier score (bruto): {np.mean((raw_proba - y_true) ** 2):.4f}")
+    print(f"   - Brier score (calibrado): {np.mean((oof_proba - y_true) ** 2):.4f}")
+    print(f"   - Taxa sinalizada: {oof_flags.mean()*100:.1f}% "
+          f"(orçamento: {MAX_FLAG_RATE*100:.0f}%)")
+    print(f"   - Precisão: {true_positives / max(oof_flags.sum(), 1):.4f}")
+    print(f"   - Recall: {true_positives / max(y_true.sum(), 1):.4f}")
+
+    # Salvar artefatos
+    calibration_path = base_path / 'calibrator.pkl'
+    joblib.dump(calibration, calibration_path)
+    print(f"\n✅ Calibrador salvo em: {calibration_path}")
+
+    thresholds_path = base_path / 'thresholds.pkl'
+    joblib.dump(thresholds, thresholds_path)
+    print(f"✅ Limiares salvos em: {thresholds_path}")
+
+    print("\n" + "=" * 70)
+    print("✅ Calibração concluída! Execute scripts/deploy_model.py para usar.")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    if '--self-check' in sys.argv:
+        self_check()
+    else:
+        main()
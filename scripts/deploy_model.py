@@ -48,6 +48,48 @@ def load_model_and_preprocessors():
     
     return model, scaler, label_encoders
 
+def load_calibration_artifacts():
+    """
+    Carrega o calibrador de probabilidades e os limiares por segmento
+    gerados por scripts/calibrate_thresholds.py (se existirem)
+    
+    Returns:
+        Tupla (calibração, limiares) - None para cada artefato ausente
+    """
+    base_path = Path(__file__).parent.parent
+    
+    calibration_path = base_path / 'calibrator.pkl'
+    calibration = None
+    if calibration_path.exists():
+        calibration = joblib.load(calibration_path)
+        print(f"✅ Calibrador ({calibration['method']}) carregado de: {calibration_path}")
+    
+    thresholds_path = base_path / 'thresholds.pkl'
+    thresholds = None
+    if thresholds_path.exists():
+        thresholds = joblib.load(thresholds_path)
+        print(f"✅ Limiares por segmento carregados de: {thresholds_path}")
+    
+    return calibration, thresholds
+
+def encode_features(df, label_encoders):
+    """
+    Aplica label encoding nas variáveis categóricas de um DataFrame
+    
+    Args:
+        df: DataFrame com os dados dos estudantes
+        label_encoders: Dicionário com os encoders para variáveis categóricas
+        
+    Returns:
+        Cópia do DataFrame com as colunas categóricas codificadas
+    """
+    df = df.copy()
+    for col, encoder in label_encoders.items():
+        if col in df.columns:
+            df[col] = encoder.transform(df[col])
+    
+    return df
+
 def prepare_new_student_data(student_data, label_encoders):
     """
     Prepara os dados de um novo estudante para predição
@@ -59,17 +101,120 @@ def prepare_new_student_data(student_data, label_encoders):
     Returns:
         DataFrame preparado
     """
-    # Criar DataFrame
-    df = pd.DataFrame([student_data])
+    # Criar DataFrame e aplicar label encoding nas variáveis categóricas
+    return encode_features(pd.DataFrame([student_data]), label_encoders)
+
+def score_dropout_proba(model, X, scaler=None):
+    """
+    Calcula a probabilidade bruta (não calibrada) de evasão
     
-    # Aplicar label encoding nas variáveis categóricas
-    for col, encoder in label_encoders.items():
-        if col in df.columns:
-            df[col] = encoder.transform(df[col])
+    Args:
+        model: Modelo treinado
+        X: DataFrame de features já codificadas
+        scaler: Scaler para normalização (opcional)
+        
+    Returns:
+        Array com a probabilidade da classe positiva para cada linha
+    """
+    if scaler:
+        X = scaler.transform(X)
+    return model.predict_proba(X)[:, 1]
+
+def apply_calibration(calibration, raw_proba):
+    """
+    Converte probabilidades brutas em probabilidades calibradas
     
-    return df
+    Args:
+        calibration: Dicionário {'method', 'calibrator'} salvo em calibrator.pkl
+        raw_proba: Array com as probabilidades brutas do modelo
+        
+    Returns:
+        Array com as probabilidades calibradas
+    """
+    raw_proba = np.asarray(raw_proba, dtype=float)
+    if calibration['method'] == 'isotonic':
+        return calibration['calibrator'].predict(raw_proba)
+    # Platt scaling: regressão logística sobre a probabilidade bruta
+    return calibration['calibrator'].predict_proba(raw_proba.reshape(-1, 1))[:, 1]
 
-def predict_dropout_risk(model, student_data, scaler=None, label_encoders=None):
+def lookup_thresholds(thresholds, df):
+    """
+    Busca, de forma vetorizada, o limiar de decisão de cada estudante
+    
+    Os níveis de segmentação são consultados do mais específico ao mais
+    geral; estudantes sem segmento com limiar próprio (pequenos ou não
+    vistos na calibração) usam o limiar global.
+    
+    Args:
+        thresholds: Dicionário salvo em thresholds.pkl
+        df: DataFrame contendo as colunas de segmento
+        
+    Returns:
+        Array com o limiar de cada linha
+    """
+    per_row = np.full(len(df), np.nan)
+    for level in thresholds['levels']:
+        columns, per_segment = level['columns'], level['thresholds']
+        if not per_segment:
+            continue
+        table = pd.Series(
+            list(per_segment.values()),
+            index=pd.MultiIndex.from_tuples(list(per_segment.keys()), names=columns),
+            dtype=float,
+        )
+        keys = pd.MultiIndex.from_frame(df[columns])
+        per_row = np.where(np.isnan(per_row), table.reindex(keys).to_numpy(), per_row)
+    
+    return np.where(np.isnan(per_row), thresholds['global_threshold'], per_row)
+
+def predict_dropout_risk_batch(model, students_df, scaler=None, label_encoders=None,
+                               calibration=None, thresholds=None):
+    """
+    Faz predição de risco de evasão para um lote de estudantes
+    
+    Args:
+        model: Modelo treinado
+        students_df: DataFrame com os dados dos estudantes
+        scaler: Scaler para normalização (opcional)
+        label_encoders: Encoders para variáveis categóricas (opcional)
+        calibration: Calibrador de probabilidades (opcional)
+        thresholds: Limiares por segmento (opcional - padrão 0.5)
+        
+    Returns:
+        DataFrame com score bruto, probabilidade de evasão (calibrada, se
+        houver calibrador), limiar aplicado e predição
+    """
+    X = students_df.drop(columns=['student_id', 'dropout'], errors='ignore')
+    if label_encoders:
+        X = encode_features(X, label_encoders)
+    
+    score = score_dropout_proba(model, X, scaler)
+    probability = score
+    if calibration:
+        probability = apply_calibration(calibration, score)
+    
+    # Os limiares só valem na escala em que foram ajustados (score bruto)
+    if thresholds and thresholds.get('score_scale') != 'raw':
+        print("⚠️  Limiares ajustados em outra escala de score - usando corte padrão 0.5.")
+        print("   Execute scripts/calibrate_thresholds.py novamente.")
+        thresholds = None
+    
+    if thresholds:
+        decision_score = score
+        threshold = lookup_thresholds(thresholds, X)
+    else:
+        decision_score = probability
+        threshold = np.full(len(X), 0.5)
+    
+    return pd.DataFrame({
+        'dropout_score': score,
+        'dropout_probability': probability,
+        'threshold': threshold,
+        'dropout_risk': (decision_score >= threshold).astype(int),
+    }, index=students_df.index)
+
+def predict_dropout_risk(model, student_data, scaler=None, label_encoders=None,
+                         calibration=None, thresholds=None):
     """
     Faz predição de risco de evasão para um novo estudante
     
@@ -78,10 +223,20 @@ def predict_dropout_risk(model, student_data, scaler=None, label_encoders=None):
         student_data: Dicionário com dados do estudante
         scaler: Scaler para normalização (opcional)
         label_encoders: Encoders para variáveis categóricas (opcional)
+        calibration: Calibrador de probabilidades (opcional)
+        thresholds: Limiares por segmento (opcional)
         
     Returns:
         Tupla (predição, probabilidade)
     """
+    if calibration or thresholds:
+        result = predict_dropout_risk_batch(
+            model, pd.DataFrame([student_data]), scaler, label_encoders,
+            calibration, thresholds
+        ).iloc[0]
+        p = result['dropout_probability']
+        return int(result['dropout_risk']), np.array([1 - p, p])
+    
     # Preparar dados
     if label_encoders:
         df = prepare_new_student_data(student_data, label_encoders)
@@ -113,6 +268,7 @@ def main():
     # Carregar modelo e pré-processadores
     print("📦 Carregando modelo e pré-processadores...")
     model, scaler, label_encoders = load_model_and_preprocessors()
+    calibration, thresholds = load_calibration_artifacts()
     print()
     
     # Exemplo 1: Estudante com alto risco de evasão
@@ -149,7 +305,7 @@ def main():
         print(f"   - {key}: {value}")
     
     prediction, probability = predict_dropout_risk(
-        model, student_high_risk, scaler, label_encoders
+        model, student_high_risk, scaler, label_encoders, calibration, thresholds
     )
     
     print(f"\n🎯 RESULTADO DA PREDIÇÃO:")
@@ -198,7 +354,7 @@ def main():
         print(f"   - {key}: {value}")
     
     prediction, probability = predict_dropout_risk(
-        model, student_low_risk, scaler, label_encoders
+        model, student_low_risk, scaler, label_encoders, calibration, thresholds
     )
     
     print(f"\n🎯 RESULTADO DA PREDIÇÃO:")